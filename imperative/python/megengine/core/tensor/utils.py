@@ -1,6 +1,5 @@
 # -*- coding: utf-8 -*-
 import collections
-import itertools
 from typing import Iterable, Union
 
 import numpy as np
@@ -32,10 +31,13 @@ from .dtype import is_dtype_equal, is_quantize
 
 jit_supported = False
 
+# python-side mirror of `_enable_convert_inputs`, kept in sync by `set_convert_inputs`
+_convert_inputs_flag = _get_convert_inputs()
+
 
 def get_convert_inputs():
     r"""get the curerent state of `_enable_convert_inputs`"""
-    return _get_convert_inputs()
+    return _convert_inputs_flag
 
 
 def set_convert_inputs(flag):
@@ -44,6 +46,8 @@ def set_convert_inputs(flag):
     `_enable_convert_inputs` is set to `False`, otherwise enabled. This function is for
     internal use only, and should be removed when the tensor-like system is refactored.
     """
+    global _convert_inputs_flag
+    _convert_inputs_flag = bool(flag)
     return _set_convert_inputs(flag)
 
 
@@ -52,29 +56,47 @@ def convert_single_value(v, *, dtype=None, device=None):
 
 
 def convert_inputs(*args, device=None):
-    if not _get_convert_inputs():
+    if not _convert_inputs_flag:
         return args
+    # tensors sharing one dtype and one device have nothing to be promoted or
+    # checked, and tensors are never moved to `device`, so they can be returned
+    # as is
+    if args and isinstance(args[0], Tensor):
+        dtype = args[0].dtype
+        cn = args[0].device
+        for arg in args[1:]:
+            if not isinstance(arg, Tensor) or arg.dtype is not dtype:
+                break
+            if arg.device != cn:
+                # let convert_inputs_cpp raise the ambiguous device error
+                break
+        else:
+            return args
     return convert_inputs_cpp(*args, device)
 
 
 def cast_tensors(*args, promote=False):
-    if promote:
-        dtype = _get_amp_high_prec_dtype()
-    else:
-        dtype = _get_amp_low_prec_dtype()
-    return tuple(arg.astype(dtype) if arg is not None else None for arg in args)
+    dtype = _get_amp_high_prec_dtype() if promote else _get_amp_low_prec_dtype()
+    # call astype_cpp directly to skip the python-level Tensor.astype frame
+    return tuple([astype_cpp(arg, dtype) if arg is not None else None for arg in args])
 
 
 def result_type(*args):
     dtypes = []
+    append = dtypes.append
     for i in args:
-        if isinstance(i, Tensor):
-            dtypes.append(i.dtype)
-            continue
-        try:
-            dtypes.append(np.dtype(i))
-        except TypeError:
-            pass
+        if isinstance(i, np.dtype):
+            append(i)
+        elif not isinstance(i, type) and hasattr(i, "dtype"):
+            # Tensor, numpy array and numpy scalar; the `dtype` of a scalar type
+            # such as np.float32 is a descriptor, so types go to np.dtype below
+            append(i.dtype)
+        elif not isinstance(i, (int, float, complex)):
+            # python scalars are not dtype-like, skip them without raising
+            try:
+                append(np.dtype(i))
+            except TypeError:
+                pass
     return np.result_type(*dtypes)
 
 
@@ -96,43 +118,55 @@ def astensor1d(x, *reference, dtype=None, device=None):
     return astensor1d_cpp(x, dtype, device, reference)
 
 
+def _wrap_axis(axis: int, ndim: int) -> int:
+    x = axis + ndim if axis < 0 else axis
+    assert 0 <= x < ndim, "axis {} is out of bounds for tensor of dimension {}".format(
+        axis, ndim
+    )
+    return x
+
+
 def _normalize_axis(
     ndim: int, axis: Union[int, Iterable], reverse=False
 ) -> Union[int, list]:
-    def convert(x):
-        x_org = x
-        if x < 0:
-            x = ndim + x
-        assert (
-            x >= 0 and x < ndim
-        ), "axis {} is out of bounds for tensor of dimension {}".format(x_org, ndim)
-        return x
-
     if isinstance(axis, int):
-        return convert(axis)
-    elif isinstance(axis, Iterable):
+        return _wrap_axis(axis, ndim)
+    # check the common containers first, the Iterable check goes through the
+    # much slower ABC machinery
+    elif isinstance(axis, (tuple, list)) or isinstance(axis, Iterable):
         axis_org = axis
-        axis = list(sorted(map(convert, axis), reverse=reverse))
-        for i in range(len(axis) - 1):
-            assert axis[i] != axis[i + 1], "axis {} contains duplicated indices".format(
+        axis = []
+        # bitmask of the axes seen so far, used for duplication check
+        mask = 0
+        for a in axis_org:
+            x = _wrap_axis(a, ndim)
+            bit = 1 << x
+            assert not mask & bit, "axis {} contains duplicated indices".format(
                 axis_org
             )
+            mask |= bit
+            axis.append(x)
+        axis.sort(reverse=reverse)
         return axis
-    raise
-
-
-_opr_map = {
-    ("-", 1): builtin.Elemwise(mode="negate"),
-    ("abs", 1): builtin.Elemwise(mode="abs"),
-    ("exp", 1): builtin.Elemwise(mode="exp"),
-    ("log1p", 1): builtin.Elemwise(mode="log1p"),
-    ("relu", 1): builtin.Elemwise(mode="relu"),
-    ("cond_leq_mov", 3): builtin.Elemwise(mode="cond_leq_mov"),
-    ("fma3", 3): builtin.Elemwise(mode="FUSE_MUL_ADD3"),
-    ("fma4", 4): builtin.Elemwise(mode="FUSE_MUL_ADD4"),
-    ("[?:]", 2): builtin.Subtensor(items=[(0, True, False, False, False)]),
-    ("[:?]", 2): builtin.Subtensor(items=[(0, False, True, False, False)]),
-}
+    raise TypeError("axis should be int or iterable of int, got {}".format(type(axis)))
+
+
+# operator name -> number of inputs -> builtin op
+_opr_map = {}
+
+for name, nargs, op in [
+    ("-", 1, builtin.Elemwise(mode="negate")),
+    ("abs", 1, builtin.Elemwise(mode="abs")),
+    ("exp", 1, builtin.Elemwise(mode="exp")),
+    ("log1p", 1, builtin.Elemwise(mode="log1p")),
+    ("relu", 1, builtin.Elemwise(mode="relu")),
+    ("cond_leq_mov", 3, builtin.Elemwise(mode="cond_leq_mov")),
+    ("fma3", 3, builtin.Elemwise(mode="FUSE_MUL_ADD3")),
+    ("fma4", 4, builtin.Elemwise(mode="FUSE_MUL_ADD4")),
+    ("[?:]", 2, builtin.Subtensor(items=[(0, True, False, False, False)])),
+    ("[:?]", 2, builtin.Subtensor(items=[(0, False, True, False, False)])),
+]:
+    _opr_map.setdefault(name, {})[nargs] = op
 
 for name, mode in [
     ("+", "add"),
@@ -148,7 +182,7 @@ for name, mode in [
     ("switch_gt0", "switch_gt0"),
     ("abs_grad", "abs_grad"),
 ]:
-    _opr_map[(name, 2)] = builtin.Elemwise(mode=mode)
+    _opr_map.setdefault(name, {})[2] = builtin.Elemwise(mode=mode)
 
 
 def subgraph(
@@ -161,17 +195,16 @@ def subgraph(
         jit_fusion = False  # jit unusable, fallback to graph compile
         gopt_level = 2
 
-    def as_op(op, nargs):
-        if isinstance(op, str):
-            assert (op, nargs) in _opr_map, "unknown operator"
-            op = _opr_map[(op, nargs)]
-        return op
+    _opr_map_get = _opr_map.get
 
     def decorator(func):
         builder = _SubgraphBuilder(name)
 
         def apply_expr(op, *args, nr_out=None):
-            op = as_op(op, len(args))
+            if op.__class__ is str:
+                ops = _opr_map_get(op)
+                assert ops is not None and len(args) in ops, "unknown operator"
+                op = ops[len(args)]
             results = builder.apply(op, args, 1 if nr_out is None else nr_out)
             if nr_out is None:
                 assert len(results) == 1
@@ -189,11 +222,20 @@ def subgraph(
             builder.outputs_has_grad(outputs_has_grad)
             if jit_fusion:
                 assert gopt_level is None
-                op = lambda: builder.jit_fuse()
+                make_op = lambda: builder.jit_fuse()
             elif gopt_level is None:
-                op = lambda: builder.get()
+                make_op = lambda: builder.get()
             else:
-                op = lambda: builder.compile(gopt_level)
+                make_op = lambda: builder.compile(gopt_level)
+            # the op is built on first use and shared by all later calls, instead
+            # of copying the subgraph into a new op on every forward/backward
+            cache = []
+
+            def op():
+                if not cache:
+                    cache.append(make_op())
+                return cache[0]
+
             return op
 
         inputs = [builder.input() for _ in range(nr_inputs)]
@@ -209,12 +251,15 @@ def subgraph(
             input_grads = gen.send(output_grads)
             assert len(input_grads) == nr_inputs
             input_grads_mask = [input_grad is not None for input_grad in input_grads]
-            indices = [
-                i - 1 if mask else None
-                for i, mask in zip(
-                    itertools.accumulate(input_grads_mask), input_grads_mask
-                )
-            ]
+            # position of each input grad in the encoded outputs of backward_fn
+            indices = []
+            nr_grads = 0
+            for mask in input_grads_mask:
+                if mask:
+                    indices.append(nr_grads)
+                    nr_grads += 1
+                else:
+                    indices.append(None)
             encoded_input_grads = [grad for grad in input_grads if grad is not None]
             backward_fn = build(
                 builder, encoded_input_grads, [True] * len(encoded_input_grads)
@@ -269,25 +314,25 @@ def subgraph(
 
 
 def interpret_subgraph(func, dtype, device):
-    def as_op(op, nargs):
-        if isinstance(op, str) and (op, nargs) in _opr_map:
-            op = _opr_map[(op, nargs)]
-        return op
-
-    def decorated_func(*args):
-        def apply_expr(op, *args, nr_out=None):
-            op = as_op(op, len(args))
-            results = apply(op, *args)
-            if nr_out is None:
-                assert len(results) == 1
-                return results[0]
-            else:
-                assert len(results) == nr_out
-                return results
+    _opr_map_get = _opr_map.get
+
+    def apply_expr(op, *args, nr_out=None):
+        if op.__class__ is str:
+            ops = _opr_map_get(op)
+            if ops is not None:
+                op = ops.get(len(args), op)
+        results = apply(op, *args)
+        if nr_out is None:
+            assert len(results) == 1
+            return results[0]
+        else:
+            assert len(results) == nr_out
+            return results
 
-        def apply_const(value, dtype=dtype, device=device):
-            return Const(value, dtype, device)
+    def apply_const(value, dtype=dtype, device=device):
+        return Const(value, dtype, device)
 
+    def decorated_func(*args):
         outputs, outputs_has_grad = func(args, apply_expr, apply_const)
         outputs = [
             output if has_grad else output.detach()
@@ -1,4 +1,5 @@
 # -*- coding: utf-8 -*-
+import atexit
 import binascii
 import os
 import pickle
@@ -6,6 +7,7 @@ import queue
 import subprocess
 from multiprocessing import Queue
 
+import numpy as np
 import pyarrow
 
 from ...logger import get_logger
@@ -19,6 +21,13 @@ except ModuleNotFoundError:
         "pyarrow remove plasma in version 12.0.0, please use pyarrow vserion < 12.0.0"
     )
 
+try:
+    # the variant used by `PlasmaClient.get`, which does not warn about the
+    # deprecated pyarrow serialization
+    from pyarrow.lib import _deserialize as _pyarrow_deserialize
+except ImportError:
+    from pyarrow import deserialize as _pyarrow_deserialize
+
 # Each process only need to start one plasma store, so we set it as a global variable.
 # TODO: how to share between different processes?
 MGE_PLASMA_STORE_MANAGER = None
@@ -33,6 +42,42 @@ def _clear_plasma_store():
         MGE_PLASMA_STORE_MANAGER = None
 
 
+# Plasma clients shared by all the queues of the current process, keyed by the
+# socket name of the plasma store.
+_plasma_clients = {}
+# number of queues using each socket name, a client is only disconnected when
+# the last of them lets it go
+_plasma_client_refs = {}
+
+
+def _get_client(socket_name):
+    client = _plasma_clients.get(socket_name)
+    if client is None:
+        client = _plasma_clients[socket_name] = plasma.connect(socket_name)
+    return client
+
+
+def _release_client(socket_name):
+    refcount = _plasma_client_refs.pop(socket_name, 0) - 1
+    if refcount > 0:
+        _plasma_client_refs[socket_name] = refcount
+        return
+    client = _plasma_clients.pop(socket_name, None)
+    if client is not None:
+        client.disconnect()
+
+
+def _disconnect_clients():
+    for client in _plasma_clients.values():
+        client.disconnect()
+    _plasma_clients.clear()
+
+
+atexit.register(_disconnect_clients)
+# a forked process must not share the socket connections of its parent
+os.register_at_fork(after_in_child=_plasma_clients.clear)
+
+
 class _ExceptionWrapper:
     def __init__(self, exc_type=None, exc_msg=None, where="in background"):
         self.exc_type = exc_type
@@ -67,8 +112,51 @@ class _ExceptionWrapper:
         return _ExceptionWrapper(data["exc_type"], data["exc_msg"], data["where"])
 
 
+# The error payloads are identical for every failure, so pickle them only once.
+_PLASMA_STORE_FULL_ERROR = pickle.dumps(
+    _ExceptionWrapper(
+        exc_type="PlasmaStoreFull", where="in DataLoader Plasma Store Put Full"
+    )
+)
+_OBJECT_ID_GET_ERROR = pickle.dumps(_ExceptionWrapper(exc_type="ObjectIDGetError"))
+
+
+# Plasma objects written by `PlasmaShmQueue._put_ndarrays` carry a pickled
+# manifest prefixed with this tag as their metadata.
+_NDARRAY_MANIFEST_TAG = b"mge_ndarray:"
+_NDARRAY_ALIGNMENT = 64
+
+
+def _split_ndarray_payload(data):
+    r"""Split the ``(idx, batch)`` payload sent by DataLoader workers, where
+    ``batch`` is an ndarray or a tuple/list of ndarrays. Returns ``None`` for
+    any other payload.
+    """
+    if type(data) is not tuple or len(data) != 2:
+        return None
+    idx, batch = data
+    if isinstance(batch, np.ndarray):
+        container, arrays = None, (batch,)
+    elif type(batch) in (tuple, list) and batch:
+        container, arrays = type(batch), batch
+    else:
+        return None
+    for array in arrays:
+        if not isinstance(array, np.ndarray) or array.dtype.hasobject:
+            return None
+    return idx, container, arrays
+
+
 class _PlasmaStoreManager:
     __initialized = False
+    # fd of /dev/null shared by all the plasma store processes started here
+    _devnull_fd = None
+
+    @classmethod
+    def _get_devnull_fd(cls):
+        if cls._devnull_fd is None:
+            cls._devnull_fd = os.open(os.devnull, os.O_WRONLY)
+        return cls._devnull_fd
 
     def __init__(self):
         self.socket_name = "/tmp/mge_plasma_{}".format(
@@ -83,10 +171,11 @@ class _PlasmaStoreManager:
         # For `plasma_store` is just a wrapper of `plasma-store-server`, which use
         # `os.execv` to call the executable `plasma-store-server`.
         cmd_path = os.path.join(pyarrow.__path__[0], "plasma-store-server")
+        output = None if debug_flag else self._get_devnull_fd()
         self.plasma_store = subprocess.Popen(
             [cmd_path, "-s", self.socket_name, "-m", str(MGE_PLASMA_MEMORY),],
-            stdout=None if debug_flag else subprocess.DEVNULL,
-            stderr=None if debug_flag else subprocess.DEVNULL,
+            stdout=output,
+            stderr=output,
         )
         self.__initialized = True
         self.refcount = 1
@@ -126,9 +215,10 @@ class PlasmaShmQueue:
             MGE_PLASMA_STORE_MANAGER.refcount += 1
 
         self.socket_name = MGE_PLASMA_STORE_MANAGER.socket_name
-
-        # TODO: how to catch the exception happened in `plasma.connect`?
-        self.client = None
+        _plasma_client_refs[self.socket_name] = (
+            _plasma_client_refs.get(self.socket_name, 0) + 1
+        )
+        self._holds_client = True
 
         # Used to store the header for the data.(ObjectIDs)
         self.queue = Queue(maxsize)  # type: Queue
@@ -138,33 +228,72 @@ class PlasmaShmQueue:
         data_buffer = pickle.dumps(data)
         return data_buffer
 
-    def put(self, data, block=True, timeout=None):
-        if self.client is None:
-            self.client = plasma.connect(self.socket_name)
+    def _put_ndarrays(self, client, idx, container, arrays):
+        # lay the arrays out back to back in one plasma buffer and describe the
+        # layout in the object metadata, bypassing pyarrow serialization
+        layout = []
+        nbytes = 0
+        for array in arrays:
+            layout.append((array.dtype, array.shape, nbytes))
+            nbytes += -(-array.nbytes // _NDARRAY_ALIGNMENT) * _NDARRAY_ALIGNMENT
+        manifest = _NDARRAY_MANIFEST_TAG + pickle.dumps((idx, container, layout))
+
+        object_id = plasma.ObjectID.from_random()
+        buf = client.create(object_id, nbytes, manifest)
+        for array, (dtype, shape, offset) in zip(arrays, layout):
+            if array.size:
+                dst = np.frombuffer(buf, dtype=dtype, count=array.size, offset=offset)
+                dst.reshape(shape)[...] = array
+        client.seal(object_id)
+        return object_id
+
+    def _get_object(self, client, object_id):
+        # the buffer and its metadata are fetched in one round trip, objects
+        # without an ndarray manifest were written by `client.put`
+        [(meta, buf)] = client.get_buffers([object_id], with_meta=True)
+        meta = meta.to_pybytes() if meta is not None else b""
+        if not meta.startswith(_NDARRAY_MANIFEST_TAG):
+            return _pyarrow_deserialize(buf)
+        idx, container, layout = pickle.loads(meta[len(_NDARRAY_MANIFEST_TAG) :])
+        arrays = []
+        for dtype, shape, offset in layout:
+            size = int(np.prod(shape))
+            if size:
+                array = np.frombuffer(buf, dtype=dtype, count=size, offset=offset)
+                arrays.append(array.reshape(shape))
+            else:
+                arrays.append(np.empty(shape, dtype=dtype))
+        if container is None:
+            return idx, arrays[0]
+        return idx, container(arrays)
+
+    def _put_object(self, client, data):
         try:
-            object_id = self.client.put(data)
+            payload = _split_ndarray_payload(data)
+            if payload is not None:
+                return self._put_ndarrays(client, *payload)
+            return client.put(data)
         except plasma.PlasmaStoreFull:
-            where = "in DataLoader Plasma Store Put Full"
-            exc_type = "PlasmaStoreFull"
-            error = self.get_error(exc_type, where)
-            object_id = self.client.put((error,))
+            return client.put((_PLASMA_STORE_FULL_ERROR,))
+
+    def put(self, data, block=True, timeout=None):
+        client = _get_client(self.socket_name)
+        object_id = self._put_object(client, data)
 
         try:
             self.queue.put(object_id, block, timeout)
         except queue.Full:
-            self.client.delete([object_id])
+            client.delete([object_id])
             raise queue.Full
 
     def get(self, block=True, timeout=None):
-        if self.client is None:
-            self.client = plasma.connect(self.socket_name)
+        client = _get_client(self.socket_name)
         object_id = self.queue.get(block, timeout)
-        if not self.client.contains(object_id):
-            exc_type = "ObjectIDGetError"
-            data = (self.get_error(exc_type),)
+        if not client.contains(object_id):
+            data = (_OBJECT_ID_GET_ERROR,)
         else:
-            data = self.client.get(object_id)
-            self.client.delete([object_id])
+            data = self._get_object(client, object_id)
+            client.delete([object_id])
         return data
 
     def qsize(self):
@@ -177,8 +306,11 @@ class PlasmaShmQueue:
         self.queue.join()
 
     def disconnect_client(self):
-        if self.client is not None:
-            self.client.disconnect()
+        # the client is shared, it stays connected while other queues use it;
+        # workers call this before `close`, so only release it once
+        if self._holds_client:
+            self._holds_client = False
+            _release_client(self.socket_name)
 
     def close(self):
         self.queue.close()
@@ -11,6 +11,7 @@ except ModuleNotFoundError as err:
     raise ModuleNotFoundError(msg)
 
 import gc
+import importlib
 import os
 import platform
 import subprocess
@@ -19,13 +20,6 @@ import warnings
 from typing import Optional
 
 import mge_xlalib.cpu_feature_guard as cpu_feature_guard
-import mge_xlalib.ducc_fft as ducc_fft
-import mge_xlalib.gpu_linalg as gpu_linalg
-import mge_xlalib.gpu_prng as gpu_prng
-import mge_xlalib.gpu_rnn as gpu_rnn
-import mge_xlalib.gpu_solver as gpu_solver
-import mge_xlalib.gpu_sparse as gpu_sparse
-import mge_xlalib.lapack as lapack
 import mge_xlalib.xla_client as xla_client
 
 from ...core._imperative_rt.common import get_cudnn_version as _get_cudnn_version
@@ -44,6 +38,26 @@ if _get_cudnn_version() < 8600:
 
 cpu_feature_guard.check_cpu_features()
 
+# extension modules that are not needed by the xla backend itself, they are only
+# loaded when first accessed (PEP 562)
+_lazy_submodules = {
+    "ducc_fft": "mge_xlalib.ducc_fft",
+    "gpu_linalg": "mge_xlalib.gpu_linalg",
+    "gpu_prng": "mge_xlalib.gpu_prng",
+    "gpu_rnn": "mge_xlalib.gpu_rnn",
+    "gpu_solver": "mge_xlalib.gpu_solver",
+    "gpu_sparse": "mge_xlalib.gpu_sparse",
+    "lapack": "mge_xlalib.lapack",
+}
+
+
+def __getattr__(name):
+    if name in _lazy_submodules:
+        module = importlib.import_module(_lazy_submodules[name])
+        globals()[name] = module
+        return module
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+
 
 xla_extension = xla_client._xla
 pytree = xla_client._xla.pytree
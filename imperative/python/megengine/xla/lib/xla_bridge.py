@@ -1,15 +1,19 @@
 # code of this file is mainly from jax: https://github.com/google/jax
+import itertools
 import logging
 import os
 import platform as py_platform
+import sys
 import threading
+import types
 import warnings
 from functools import lru_cache, partial
-from typing import Any, Dict, List, Optional, Union
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple, Union
 
 import numpy as np
 from mge_xlalib import xla_client
 
+from ..distribute import global_state
 from ..lib import cuda_path
 from .config import bool_env, config, flags, int_env
 
@@ -19,6 +23,9 @@ FLAGS = flags.FLAGS
 
 logger = logging.getLogger(__name__)
 
+# cuda_path is resolved once when megengine.xla.lib is imported
+_has_cuda_path = cuda_path is not None
+
 flags.DEFINE_string(
     "xla_backend", "", "Deprecated, please use --xla_platforms instead."
 )
@@ -59,6 +66,116 @@ flags.DEFINE_string(
 )
 
 
+class _CompileOptionsSpec(NamedTuple):
+    num_replicas: int
+    num_partitions: int
+    device_assignment: Optional[xla_client.DeviceAssignment]
+    use_spmd_partitioning: bool
+    use_auto_spmd_partitioning: bool
+    auto_spmd_partitioning_mesh_shape: Tuple[int, ...]
+    auto_spmd_partitioning_mesh_ids: Tuple[int, ...]
+    disable_most_optimizations: bool
+    profile_version: int
+
+
+@lru_cache(maxsize=64)
+def _make_device_assignment(
+    device_assignment_shape: Tuple[int, ...], device_assignment_ids: Tuple[int, ...]
+) -> xla_client.DeviceAssignment:
+    # keyed on the topology only, so compile options that differ in their flags
+    # share the same DeviceAssignment
+    device_assignment = np.array(device_assignment_ids).reshape(device_assignment_shape)
+    return xla_client.DeviceAssignment.create(device_assignment)
+
+
+@lru_cache(maxsize=128)
+def _get_compile_options_spec(
+    num_replicas: int,
+    num_partitions: int,
+    device_assignment_shape: Optional[Tuple[int, ...]],
+    device_assignment_ids: Optional[Tuple[int, ...]],
+    use_spmd_partitioning: bool,
+    use_auto_spmd_partitioning: bool,
+    auto_spmd_partitioning_mesh_shape: Tuple[int, ...],
+    auto_spmd_partitioning_mesh_ids: Tuple[int, ...],
+    disable_most_optimizations: bool,
+    profile_version: int,
+) -> _CompileOptionsSpec:
+    # flag values are part of the arguments so that they are part of the cache key
+    if device_assignment_ids is not None:
+        # Allow 1D device assignment if num_partitions is 1.
+        if len(device_assignment_shape) == 1 and num_partitions == 1:
+            device_assignment_shape += (1,)
+
+        if num_replicas != device_assignment_shape[0]:
+            msg = "device_assignment does not match num_replicas: {} vs {}."
+            raise ValueError(
+                msg.format(
+                    np.array(device_assignment_ids).reshape(device_assignment_shape),
+                    num_replicas,
+                )
+            )
+
+        if num_partitions != device_assignment_shape[1]:
+            msg = "device_assignment does not match num_partitions: {} vs {}."
+            raise ValueError(
+                msg.format(
+                    np.array(device_assignment_ids).reshape(device_assignment_shape),
+                    num_partitions,
+                )
+            )
+
+        device_assignment = _make_device_assignment(
+            device_assignment_shape, device_assignment_ids
+        )
+        assert device_assignment.replica_count() == num_replicas
+        assert device_assignment.computation_count() == num_partitions
+    else:
+        device_assignment = None
+
+    return _CompileOptionsSpec(
+        num_replicas,
+        num_partitions,
+        device_assignment,
+        use_spmd_partitioning,
+        use_auto_spmd_partitioning,
+        auto_spmd_partitioning_mesh_shape,
+        auto_spmd_partitioning_mesh_ids,
+        disable_most_optimizations,
+        profile_version,
+    )
+
+
+def _make_compile_options(spec: _CompileOptionsSpec) -> xla_client.CompileOptions:
+    compile_options = xla_client.CompileOptions()
+    compile_options.num_replicas = spec.num_replicas
+    compile_options.num_partitions = spec.num_partitions
+    build_options = compile_options.executable_build_options
+    build_options.use_spmd_partitioning = spec.use_spmd_partitioning
+    build_options.use_auto_spmd_partitioning = spec.use_auto_spmd_partitioning
+    if spec.use_auto_spmd_partitioning:
+        build_options.auto_spmd_partitioning_mesh_shape = list(
+            spec.auto_spmd_partitioning_mesh_shape
+        )
+        build_options.auto_spmd_partitioning_mesh_ids = list(
+            spec.auto_spmd_partitioning_mesh_ids
+        )
+    if spec.device_assignment is not None:
+        compile_options.device_assignment = spec.device_assignment
+
+    debug_options = compile_options.executable_build_options.debug_options
+    if _has_cuda_path:
+        debug_options.xla_gpu_cuda_data_dir = cuda_path
+
+    if spec.disable_most_optimizations:
+        debug_options.xla_backend_optimization_level = 0
+        debug_options.xla_llvm_disable_expensive_passes = True
+        debug_options.xla_test_all_input_layouts = False
+
+    compile_options.profile_version = spec.profile_version
+    return compile_options
+
+
 def get_compile_options(
     num_replicas: int,
     num_partitions: int,
@@ -86,58 +203,37 @@ def get_compile_options(
         auto_spmd_partitioning_mesh_ids: device ids used to create
         auto_spmd_partitioning search space.
     """
-    compile_options = xla_client.CompileOptions()
-    compile_options.num_replicas = num_replicas
-    compile_options.num_partitions = num_partitions
-    build_options = compile_options.executable_build_options
-    build_options.use_spmd_partitioning = use_spmd_partitioning
-    build_options.use_auto_spmd_partitioning = use_auto_spmd_partitioning
-    if use_auto_spmd_partitioning:
-        build_options.auto_spmd_partitioning_mesh_shape = (
-            auto_spmd_partitioning_mesh_shape
-        )
-        build_options.auto_spmd_partitioning_mesh_ids = auto_spmd_partitioning_mesh_ids
+    device_assignment_shape = device_assignment_ids = None
     if device_assignment is not None:
-        logger.debug(
-            "get_compile_options: num_replicas=%s num_partitions=%s device_assignment=%s",
-            num_replicas,
-            num_partitions,
-            device_assignment,
-        )
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                "get_compile_options: num_replicas=%s num_partitions=%s device_assignment=%s",
+                num_replicas,
+                num_partitions,
+                device_assignment,
+            )
         device_assignment = np.array(device_assignment)
-
-        # Allow 1D device assignment if num_partitions is 1.
-        if (device_assignment.ndim == 1) and (num_partitions == 1):
-            device_assignment = device_assignment[:, None]
-
-        if num_replicas != device_assignment.shape[0]:
-            msg = "device_assignment does not match num_replicas: {} vs {}."
-            raise ValueError(msg.format(device_assignment, num_replicas))
-
-        if num_partitions != device_assignment.shape[1]:
-            msg = "device_assignment does not match num_partitions: {} vs {}."
-            raise ValueError(msg.format(device_assignment, num_partitions))
-
+        device_assignment_shape = device_assignment.shape
         if device_assignment.dtype == object:
-            device_assignment = np.vectorize(lambda d: d.id, otypes=[int])(
-                device_assignment
-            )
-        device_assignment = xla_client.DeviceAssignment.create(device_assignment)
-        assert device_assignment.replica_count() == num_replicas
-        assert device_assignment.computation_count() == num_partitions
-        compile_options.device_assignment = device_assignment
-
-    debug_options = compile_options.executable_build_options.debug_options
-    if cuda_path is not None:
-        debug_options.xla_gpu_cuda_data_dir = cuda_path
-
-    if FLAGS.xla_disable_most_optimizations:
-        debug_options.xla_backend_optimization_level = 0
-        debug_options.xla_llvm_disable_expensive_passes = True
-        debug_options.xla_test_all_input_layouts = False
-
-    compile_options.profile_version = FLAGS.xla_profile_version
-    return compile_options
+            device_assignment_ids = tuple([d.id for d in device_assignment.flat])
+        else:
+            device_assignment_ids = tuple(device_assignment.ravel().tolist())
+
+    # the validated settings and the DeviceAssignment are cached, but callers
+    # modify the returned options, so a new CompileOptions is made on each call
+    spec = _get_compile_options_spec(
+        num_replicas,
+        num_partitions,
+        device_assignment_shape,
+        device_assignment_ids,
+        use_spmd_partitioning,
+        use_auto_spmd_partitioning,
+        tuple(auto_spmd_partitioning_mesh_shape),
+        tuple(auto_spmd_partitioning_mesh_ids),
+        FLAGS.xla_disable_most_optimizations,
+        FLAGS.xla_profile_version,
+    )
+    return _make_compile_options(spec)
 
 
 # Backends, in increasing order of preference.
@@ -145,17 +241,36 @@ def get_compile_options(
 # example, there could be multiple backends that provide the same kind of
 # device.
 _backend_factories = {}
-_default_backend = None
+# names of registered factories and of platform aliases, see `is_known_platform`
+_known_platforms = frozenset()
+# (platform, priority) of all the registered factories, built lazily by `backends()`
+_factory_priorities = None
+# marks `_default_backend` as not initialized yet
+_MISSING = object()
+_default_backend = _MISSING
 _backends: Dict[str, Any] = {}
 _backends_errors: Dict[str, str] = {}
 _backend_lock = threading.Lock()
+# serializes the creation of the backend clients in `backends()`
+_backend_init_lock = threading.Lock()
+# cache of `get_backend`, guarded by its own lock because resolving a backend
+# takes `_backend_lock` in `backends()`
+_backend_cache: Dict[Any, Any] = {}
+_backend_cache_lock = threading.Lock()
 
 
 def register_backend_factory(name, factory, *, priority=0):
-    with _backend_lock:
+    global _known_platforms
+    global _factory_priorities
+
+    name = sys.intern(name)
+    # also wait for a running initialization, it would not see the new factory
+    with _backend_init_lock, _backend_lock:
         if name in _backends:
             raise RuntimeError(f"Backend {name} already initialized")
-    _backend_factories[name] = (factory, priority)
+        _backend_factories[name] = (factory, priority)
+        _known_platforms = _known_platforms | {name}
+        _factory_priorities = None
 
 
 register_backend_factory(
@@ -167,8 +282,6 @@ register_backend_factory(
 
 
 def make_gpu_client(*, platform_name, visible_devices_flag):
-    from ..distribute import global_state
-
     visible_devices = global_state.visible_devices
     if visible_devices != "all":
         allowed_devices = {int(x) for x in visible_devices.split(",")}
@@ -215,18 +328,25 @@ _platform_aliases = {
     "rocm": "gpu",
 }
 
-_alias_to_platforms: Dict[str, List[str]] = {}
+_alias_to_platforms: Dict[str, Tuple[str, ...]] = {}
 for _platform, _alias in _platform_aliases.items():
-    _alias_to_platforms.setdefault(_alias, []).append(_platform)
+    _alias_to_platforms[_alias] = _alias_to_platforms.get(_alias, ()) + (_platform,)
+
+# both tables are fixed once the module is imported
+_platform_aliases = types.MappingProxyType(_platform_aliases)
+_alias_to_platforms = types.MappingProxyType(_alias_to_platforms)
+
+_known_platforms = _known_platforms | frozenset(_platform_aliases)
 
 
 def is_known_platform(platform: str):
     # A platform is valid if there is a registered factory for it. It does not
     # matter if we were unable to initialize that platform; we only care that
     # we've heard of it and it isn't, e.g., a typo.
-    return platform in _backend_factories.keys() or platform in _platform_aliases.keys()
+    return platform in _known_platforms
 
 
+@lru_cache(maxsize=16)
 def canonicalize_platform(platform: str) -> str:
     """Replaces platform aliases with their concrete equivalent.
 
@@ -235,13 +355,15 @@ def canonicalize_platform(platform: str) -> str:
     purposes such as MLIR lowering rules, but in many cases we don't want to
     force users to care.
     """
+    if isinstance(platform, str):
+        platform = sys.intern(platform)
     platforms = _alias_to_platforms.get(platform, None)
     if platforms is None:
         return platform
 
     b = backends()
     for p in platforms:
-        if p in b.keys():
+        if p in b:
             return p
     raise RuntimeError(
         f"Unknown backend: '{platform}' requested, but no "
@@ -250,13 +372,13 @@ def canonicalize_platform(platform: str) -> str:
     )
 
 
-def expand_platform_alias(platform: str) -> List[str]:
-    """Expands, e.g., "gpu" to ["cuda", "rocm"].
+def expand_platform_alias(platform: str) -> Tuple[str, ...]:
+    """Expands, e.g., "gpu" to ("cuda", "rocm").
 
     This is used for convenience reasons: we expect cuda and rocm to act similarly
     in many respects since they share most of the same code.
     """
-    return _alias_to_platforms.get(platform, [platform])
+    return _alias_to_platforms.get(platform, (platform,))
 
 
 def is_gpu(platform):
@@ -267,33 +389,53 @@ def backends():
     global _backends
     global _backends_errors
     global _default_backend
+    global _factory_priorities
 
-    with _backend_lock:
+    # `_backends` is only ever replaced by a fully initialized dict, so it can be
+    # read without taking any lock
+    if _backends:
+        return _backends
+
+    # creating the clients may take seconds, it is serialized by its own lock so
+    # that `_backend_lock` is only held while reading or publishing the tables
+    with _backend_init_lock:
         if _backends:
             return _backends
-        if config.xla_platforms:
-            xla_platforms = config.xla_platforms.split(",")
-            platforms = []
-            # Allow platform aliases in the list of platforms.
-            for platform in xla_platforms:
-                platforms.extend(expand_platform_alias(platform))
-            priorities = range(len(platforms), 0, -1)
-            platforms_and_priorites = zip(platforms, priorities)
-        else:
-            platforms_and_priorites = (
-                (platform, priority)
-                for platform, (_, priority) in _backend_factories.items()
-            )
+        with _backend_lock:
+            if config.xla_platforms:
+                xla_platforms = config.xla_platforms.split(",")
+                # Allow platform aliases in the list of platforms.
+                platforms = list(
+                    itertools.chain.from_iterable(
+                        _alias_to_platforms.get(p, (p,)) for p in xla_platforms
+                    )
+                )
+                # earlier platforms in the list get higher priorities
+                nr_platforms = len(platforms)
+                platforms_and_priorites = [
+                    (platform, nr_platforms - i) for i, platform in enumerate(platforms)
+                ]
+            else:
+                if _factory_priorities is None:
+                    _factory_priorities = tuple(
+                        (platform, priority)
+                        for platform, (_, priority) in _backend_factories.items()
+                    )
+                platforms_and_priorites = _factory_priorities
+
+        new_backends = {}
+        new_backends_errors = {}
+        new_default_backend = None
         default_priority = -1000
         if hasattr(xla_client, "maybe_load_pjrt_plugins"):
             xla_client.maybe_load_pjrt_plugins()
         for platform, priority in platforms_and_priorites:
             try:
                 backend = _init_backend(platform)
-                _backends[platform] = backend
+                new_backends[platform] = backend
 
                 if priority > default_priority:
-                    _default_backend = backend
+                    new_default_backend = backend
                     default_priority = priority
             except Exception as err:
                 if platform in ("cpu", "interpreter"):
@@ -308,18 +450,24 @@ def backends():
                         err_msg += " (set XLA_PLATFORMS='' to automatically choose an available backend)"
                         raise RuntimeError(err_msg)
                     else:
-                        _backends_errors[platform] = str(err)
+                        new_backends_errors[platform] = str(err)
                         logger.info(err_msg)
                         continue
-        # We don't warn about falling back to CPU on Mac OS, because we don't
-        # support anything else there at the moment and warning would be pointless.
-        if (
-            py_platform.system() != "Darwin"
-            and _default_backend.platform == "cpu"
-            and FLAGS.xla_platform_name != "cpu"
-        ):
-            logger.warning("No GPU/TPU found, falling back to CPU. ")
-        return _backends
+
+        with _backend_lock:
+            _backends_errors = new_backends_errors
+            _default_backend = new_default_backend
+            _backends = new_backends
+
+    # We don't warn about falling back to CPU on Mac OS, because we don't
+    # support anything else there at the moment and warning would be pointless.
+    if (
+        py_platform.system() != "Darwin"
+        and new_default_backend.platform == "cpu"
+        and FLAGS.xla_platform_name != "cpu"
+    ):
+        logger.warning("No GPU/TPU found, falling back to CPU. ")
+    return new_backends
 
 
 def _clear_backends():
@@ -331,9 +479,13 @@ def _clear_backends():
     with _backend_lock:
         _backends = {}
         _backends_errors = {}
-        _default_backend = None
+        _default_backend = _MISSING
 
-    get_backend.cache_clear()
+    with _backend_cache_lock:
+        _backend_cache.clear()
+    _get_backend_info.cache_clear()
+    canonicalize_platform.cache_clear()
+    _local_devices.cache_clear()
 
 
 def _init_backend(platform):
@@ -341,7 +493,9 @@ def _init_backend(platform):
     if factory is None:
         raise RuntimeError(f"Unknown backend '{platform}'")
 
-    logger.debug("Initializing backend '%s'", platform)
+    debug = logger.isEnabledFor(logging.DEBUG)
+    if debug:
+        logger.debug("Initializing backend '%s'", platform)
     backend = factory()
     # TODO: consider raising more descriptive errors directly from backend
     # factories instead of returning None.
@@ -349,7 +503,8 @@ def _init_backend(platform):
         raise RuntimeError(f"Could not initialize backend '{platform}'")
     if backend.device_count() == 0:
         raise RuntimeError(f"Backend '{platform}' provides no devices.")
-    logger.debug("Backend '%s' initialized", platform)
+    if debug:
+        logger.debug("Backend '%s' initialized", platform)
     return backend
 
 
@@ -360,6 +515,15 @@ def _get_backend_uncached(platform=None):
         return platform
 
     platform = platform or FLAGS.xla_backend or FLAGS.xla_platform_name or None
+    if platform is None:
+        # the default backend is only set once all the backends are initialized,
+        # so a single read of the global is enough and no lock is needed
+        default_backend = _default_backend
+        if default_backend is not _MISSING:
+            return default_backend
+    else:
+        # names from flags and environment are not interned like the literals
+        platform = sys.intern(platform)
 
     bs = backends()
     if platform is not None:
@@ -377,9 +541,38 @@ def _get_backend_uncached(platform=None):
         return _default_backend
 
 
-@lru_cache(maxsize=None)  # don't use util.memoize because there is no X64 dependence.
 def get_backend(platform=None):
-    return _get_backend_uncached(platform)
+    # lock-free lookup first, the lock is only taken on a cache miss
+    backend = _backend_cache.get(platform)
+    if backend is not None:
+        return backend
+    with _backend_cache_lock:
+        backend = _backend_cache.get(platform)
+        if backend is None:
+            backend = _get_backend_uncached(platform)
+            _backend_cache[platform] = backend
+    return backend
+
+
+class _BackendInfo(NamedTuple):
+    devices: Tuple[xla_client.Device, ...]
+    device_count: int
+    local_device_count: int
+    process_index: int
+    process_count: int
+
+
+@lru_cache(maxsize=8)
+def _get_backend_info(backend: XlaBackend) -> _BackendInfo:
+    # the devices of an initialized backend never change, so query them once
+    devices = tuple(backend.devices())
+    return _BackendInfo(
+        devices=devices,
+        device_count=backend.device_count(),
+        local_device_count=backend.local_device_count(),
+        process_index=backend.process_index(),
+        process_count=max(d.process_index for d in devices) + 1,
+    )
 
 
 def get_device_backend(device=None):
@@ -406,12 +599,12 @@ def device_count(backend: Optional[Union[str, XlaBackend]] = None) -> int:
         Number of devices.
 
     """
-    return int(get_backend(backend).device_count())
+    return _get_backend_info(get_backend(backend)).device_count
 
 
 def local_device_count(backend: Optional[Union[str, XlaBackend]] = None) -> int:
     """Returns the number of devices addressable by this process."""
-    return int(get_backend(backend).local_device_count())
+    return _get_backend_info(get_backend(backend)).local_device_count
 
 
 def devices(
@@ -437,7 +630,7 @@ def devices(
     Returns:
         List of Device subclasses.
     """
-    return get_backend(backend).devices()
+    return list(_get_backend_info(get_backend(backend)).devices)
 
 
 def default_backend() -> str:
@@ -445,6 +638,15 @@ def default_backend() -> str:
     return get_backend(None).platform
 
 
+@lru_cache(maxsize=32)
+def _local_devices(backend: XlaBackend, process_index: int) -> tuple:
+    return tuple(
+        d
+        for d in _get_backend_info(backend).devices
+        if d.process_index == process_index
+    )
+
+
 def local_devices(
     process_index: Optional[int] = None,
     backend: Optional[Union[str, XlaBackend]] = None,
@@ -471,11 +673,12 @@ def local_devices(
             "your code."
         )
         process_index = host_id
+    backend = get_backend(backend)
     if process_index is None:
-        process_index = get_backend(backend).process_index()
+        process_index = _get_backend_info(backend).process_index
     if not (0 <= process_index < process_count()):
         raise ValueError(f"Unknown process_index {process_index}")
-    return [d for d in devices(backend) if d.process_index == process_index]
+    return list(_local_devices(backend, process_index))
 
 
 def process_index(backend: Optional[Union[str, XlaBackend]] = None) -> int:
@@ -492,7 +695,7 @@ def process_index(backend: Optional[Union[str, XlaBackend]] = None) -> int:
     Returns:
         Integer process index.
     """
-    return get_backend(backend).process_index()
+    return _get_backend_info(get_backend(backend)).process_index
 
 
 def host_id(backend=None):
@@ -505,7 +708,7 @@ def host_id(backend=None):
 
 def process_count(backend: Optional[Union[str, XlaBackend]] = None) -> int:
     """Returns the number of XLA processes associated with the backend."""
-    return max(d.process_index for d in devices(backend)) + 1
+    return _get_backend_info(get_backend(backend)).process_count
 
 
 def host_count(backend=None):
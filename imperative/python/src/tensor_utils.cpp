@@ -483,15 +483,17 @@ py::object _astensor1d_cpp(
         py::handle value, py::handle dtype, py::handle device, py::handle ref) {
     py::object ret;
     py::object device_obj = py::none();
-    py::object ndim_obj = py::none();
     if (device.ptr() != Py_None) {
         device_obj = device2obj(device);
     }
 
-    if (PyObject_TypeCheck(value.ptr(), py_varnode_type)) {
-        try {
-            getattr(value, "ndim");
-        } catch (py::error_already_set& err) {
+    // fetch `ndim` only once and check the result instead of raising and
+    // catching a C++ exception, a VarNode with unknown shape fails here
+    py::object ndim_obj = py::reinterpret_steal<py::object>(
+            PyObject_GetAttrString(value.ptr(), "ndim"));
+    if (!ndim_obj) {
+        PyErr_Clear();
+        if (PyObject_TypeCheck(value.ptr(), py_varnode_type)) {
             if (dtype.ptr() != Py_None) {
                 ret = _astype_cpp(value, dtype);
             } else {
@@ -507,11 +509,8 @@ py::object _astensor1d_cpp(
             }
             return ret;
         }
-    }
-
-    size_t ndim = 999;
-    if (hasattr(value, "ndim")) {
-        ndim = getattr(value, "ndim").cast<size_t>();
+    } else {
+        size_t ndim = ndim_obj.cast<size_t>();
         if (ndim != 0 && ndim != 1) {
             throw py::value_error("ndim != 1 or 0, get : " + std::to_string(ndim));
         }
@@ -548,13 +547,57 @@ py::object _astensor1d_cpp(
                 }
             }
         }
-        std::vector<PyObject*> c_args(flat_list.size() + 1);
+        // tensors sharing one dtype need no promotion, skip convert_inputs
+        bool same_dtype_tensors = true;
+        mgb::DType first_dtype;
         for (size_t i = 0; i < flat_list.size(); ++i) {
-            c_args[i] = flat_list[i].ptr();
+            auto* tw = TensorWrapper::try_cast(flat_list[i].ptr());
+            if (!tw) {
+                same_dtype_tensors = false;
+                break;
+            }
+            if (i == 0) {
+                first_dtype = tw->m_tensor->dtype();
+            } else if (tw->m_tensor->dtype() != first_dtype) {
+                same_dtype_tensors = false;
+                break;
+            }
+        }
+        py::tuple inp_tup;
+        if (same_dtype_tensors) {
+            inp_tup = py::reinterpret_steal<py::tuple>(PyList_AsTuple(flat_list.ptr()));
+            if (!inp_tup) {
+                throw py::error_already_set();
+            }
+            // convert_inputs is skipped, but tensors on different comp nodes must
+            // still be rejected by _get_device
+            std::vector<PyObject*> inp(inp_tup.size());
+            for (size_t i = 0; i < inp_tup.size(); ++i) {
+                inp[i] = inp_tup[i].ptr();
+            }
+            py::object inp_device = py::cast(_get_device(inp.data(), inp.size()));
+            if (device_obj.is_none()) {
+                device_obj = inp_device;
+            }
+        } else {
+            std::vector<PyObject*> c_args(flat_list.size() + 1);
+            for (size_t i = 0; i < flat_list.size(); ++i) {
+                c_args[i] = flat_list[i].ptr();
+            }
+            c_args[flat_list.size()] = Py_None;
+            if (dtype.ptr() != Py_None) {
+                // convert straight to the requested dtype instead of the promoted
+                // one, so that the astype after Concat is a no-op
+                py::object inp_device =
+                        py::cast(_get_device(c_args.data(), flat_list.size()));
+                inp_tup = py::reinterpret_borrow<py::tuple>(_convert_inputs_cpp(
+                        c_args.data(), flat_list.size(),
+                        py::reinterpret_borrow<py::object>(dtype), inp_device));
+            } else {
+                inp_tup = py::reinterpret_steal<py::tuple>(
+                        convert_inputs_cpp(NULL, c_args.data(), c_args.size()));
+            }
         }
-        c_args[flat_list.size()] = Py_None;
-        py::tuple inp_tup = py::reinterpret_steal<py::tuple>(
-                convert_inputs_cpp(NULL, c_args.data(), c_args.size()));
         if (!inp_tup) {
             throw py::error_already_set();
         }
@@ -158,6 +158,20 @@ def test_subgraph_jit_backward():
         gm.backward(y2)
 
 
+def test_subgraph_jit_backward_grad_manager_group():
+    x_np = np.random.rand(3, 4, 5).astype("float32")
+    x = megengine.Tensor(x_np)
+    mul = _get_mul_fn(x.dtype, x.device)
+    gm = GradManager().attach([x])
+    gm2 = GradManager().attach([x])
+    # the backward of one op is called once for each grad manager of the group
+    with gm | gm2:
+        (y,) = mul(x, x)
+        gm.backward(y)
+        gm2.backward(y)
+    _assert_allclose(x.grad.numpy(), 4 * x_np)
+
+
 @pytest.mark.skipif(
     platform.system() != "Linux", reason="jit fusion is only available on Linux",
 )
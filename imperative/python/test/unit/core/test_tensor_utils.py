@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+
+from megengine.core.tensor.utils import (
+    _normalize_axis,
+    astensor1d,
+    convert_inputs,
+    result_type,
+)
+from megengine.tensor import Tensor
+
+
+def test_result_type():
+    x = Tensor(np.ones(3, dtype="float32"))
+    assert result_type(x, np.float32) == np.float32
+    assert result_type(x, np.int8) == np.float32
+    assert result_type(x, np.float16(1.0)) == np.float32
+    assert result_type(x, np.ones(3, dtype="float16")) == np.float32
+    assert result_type(np.int16, "int32", 1.0) == np.int32
+    assert result_type(np.dtype("uint8"), 1) == np.uint8
+
+
+def test_convert_inputs_ambiguous_device():
+    x = Tensor(np.ones(3, dtype="float32"), device="cpu0")
+    y = Tensor(np.ones(3, dtype="float32"), device="cpu1")
+    x1, x2 = convert_inputs(x, x)
+    assert x1 is x and x2 is x
+    with pytest.raises(ValueError, match="ambiguous device"):
+        convert_inputs(x, y)
+
+
+@pytest.mark.parametrize("device", [None, "cpu0"])
+def test_astensor1d_ambiguous_device(device):
+    x = Tensor([1], dtype="int32", device="cpu0")
+    y = Tensor([2], dtype="int32", device="cpu1")
+    with pytest.raises(ValueError, match="ambiguous device"):
+        astensor1d([x, y], device=device)
+
+
+def test_normalize_axis():
+    assert _normalize_axis(3, 1) == 1
+    assert _normalize_axis(3, -1) == 2
+    assert _normalize_axis(4, (0, -1, 2)) == [0, 2, 3]
+    assert _normalize_axis(4, [0, -1, 2], reverse=True) == [3, 2, 0]
+    with pytest.raises(AssertionError):
+        _normalize_axis(3, 3)
+    with pytest.raises(AssertionError):
+        _normalize_axis(3, -4)
+    with pytest.raises(AssertionError):
+        _normalize_axis(3, (0, -3))
+    with pytest.raises(TypeError):
+        _normalize_axis(3, 1.0)
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+
+pytestmark = pytest.mark.skipif(
+    np.__version__ >= "1.20.0",
+    reason="pyarrow is incompatible with numpy vserion 1.20.0",
+)
+
+
+@pytest.fixture
+def shm_queue():
+    from megengine.data.tools._queue import PlasmaShmQueue
+
+    q = PlasmaShmQueue()
+    yield q
+    q.close()
+
+
+def _assert_same_arrays(actual, expected):
+    assert len(actual) == len(expected)
+    for a, e in zip(actual, expected):
+        assert a.dtype == e.dtype
+        assert a.shape == e.shape
+        np.testing.assert_equal(a, e)
+
+
+@pytest.mark.parametrize("container", [None, tuple, list])
+def test_plasma_queue_ndarray_roundtrip(shm_queue, container):
+    arrays = [np.random.rand(4, 3).astype("float32"), np.arange(5, dtype="int64")]
+    batch = arrays[0] if container is None else container(arrays)
+
+    shm_queue.put((7, batch))
+    idx, data = shm_queue.get(timeout=5)
+    assert idx == 7
+    if container is None:
+        _assert_same_arrays([data], [batch])
+    else:
+        assert type(data) is container
+        _assert_same_arrays(data, arrays)
+
+
+def test_plasma_queue_special_ndarrays(shm_queue):
+    base = np.arange(24, dtype="float32").reshape(4, 6)
+    arrays = (
+        np.empty((0, 3), dtype="float32"),
+        np.array(3.5),
+        base[:, ::2],
+        base.T,
+        np.zeros((3,), dtype=bool),
+    )
+
+    shm_queue.put((0, arrays))
+    idx, data = shm_queue.get(timeout=5)
+    assert idx == 0
+    _assert_same_arrays(data, arrays)
+
+
+def test_plasma_queue_object_fallback(shm_queue):
+    from megengine.data.tools._queue import _split_ndarray_payload
+
+    batch = (np.array(["a", None], dtype=object), np.arange(3))
+    assert _split_ndarray_payload((1, batch)) is None
+    shm_queue.put((1, batch))
+    idx, data = shm_queue.get(timeout=5)
+    assert idx == 1
+    assert data[0].tolist() == ["a", None]
+    np.testing.assert_equal(data[1], batch[1])
+
+    # e.g. the worker id sent at the end of a stream
+    shm_queue.put((2, 3))
+    assert tuple(shm_queue.get(timeout=5)) == (2, 3)
+
+
+def test_plasma_queue_store_full(shm_queue, monkeypatch):
+    from megengine.data.tools import _queue
+
+    def put_ndarrays(self, client, idx, container, arrays):
+        raise _queue.plasma.PlasmaStoreFull()
+
+    monkeypatch.setattr(_queue.PlasmaShmQueue, "_put_ndarrays", put_ndarrays)
+    shm_queue.put((0, np.zeros(4)))
+    assert tuple(shm_queue.get(timeout=5)) == (_queue._PLASMA_STORE_FULL_ERROR,)
+
+
+def test_plasma_queue_close_keeps_shared_client(shm_queue):
+    from megengine.data.tools._queue import PlasmaShmQueue
+
+    other = PlasmaShmQueue()
+    other.disconnect_client()
+    other.close()
+
+    shm_queue.put((0, np.arange(3)))
+    idx, data = shm_queue.get(timeout=5)
+    assert idx == 0
+    np.testing.assert_equal(data, np.arange(3))